@@ -24,6 +24,9 @@ def ensure_schema(conn: sqlite3.Connection):
     if "image_url" not in cols:
         cur.execute("ALTER TABLE products ADD COLUMN image_url TEXT")
 
+    # insert_product procura por URL antes de inserir
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_products_url ON products(url)")
+
     conn.commit()
 
 
@@ -41,7 +44,7 @@ def insert_product(conn, name: str, url: str):
         "INSERT INTO products (name, url, image_url) VALUES (?, ?, NULL)",
         (name, url),
     )
-    conn.commit()
+    # sem commit aqui: quem chama controla a transação
     prod_id = cur.lastrowid
     print(f"[OK] Produto inserido (id={prod_id}): {name}")
     return prod_id
@@ -66,8 +69,10 @@ def main():
         ),
     ]
 
-    for name, url in produtos:
-        insert_product(conn, name, url)
+    # todos os inserts em uma transação só (um commit no final)
+    with conn:
+        for name, url in produtos:
+            insert_product(conn, name, url)
 
     # só pra conferir o resultado
     cur = conn.cursor()
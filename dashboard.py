@@ -1,23 +1,31 @@
 import sqlite3
 import json
+import math
 import re
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html import escape, unescape
 
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+import numpy as np
 import pandas as pd
-import seaborn as sns
 import requests
 import streamlit as st
-from bs4 import BeautifulSoup
-
-from utils import extract_price  # converte texto de preço em float
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from lxml import etree
+from lxml import html as lxml_html
+from requests_cache import CachedSession
 
 # =============================================================================
 # CONFIG BÁSICA / GITHUB
 # =============================================================================
 
-DB_TEMP_PATH = "/tmp/scraping_remote.db"
+HTML_CACHE_PATH = "/tmp/amazon_html_cache"
+# url do produto -> url da imagem já encontrada (vale por IMAGE_CACHE_TTL segundos)
+IMAGE_CACHE_PATH = "/tmp/amazon_image_cache.db"
+IMAGE_CACHE_TTL = 7 * 24 * 3600
+# espera mínima (s) antes de buscar de novo uma imagem que falhou
+IMAGE_RETRY_INTERVAL = 60
 
 GITHUB_REPO = "guilhermepires06/amazon-price-monitor"
 GITHUB_BRANCH = "main"
@@ -37,14 +45,60 @@ HEADERS = {
     "Accept-Language": "pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7",
 }
 
+# fuso usado para exibir as datas (o banco grava em UTC)
+LOCAL_TZ = "America/Manaus"
+
+# quantidade de cards por página no grid de produtos
+PAGE_SIZE = 12
+
+# acima de LTTB_THRESHOLD pontos o gráfico é reduzido para LTTB_POINTS (LTTB)
+LTTB_THRESHOLD = 1000
+LTTB_POINTS = 500
+
+# quantos produtos ficam em cada cache por produto (gráfico, histórico...)
+HISTORY_CACHE_ENTRIES = 32
+
 # =============================================================================
-# CACHE – HTML (para imagens da Amazon)
+# SESSÕES HTTP / CACHE – HTML (para imagens da Amazon)
 # =============================================================================
 
+def _mount_pool(session: requests.Session) -> None:
+    """Pool de conexões + retry com backoff para erros transitórios."""
+    retry = Retry(
+        total=2,
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        raise_on_status=False,
+    )
+    session.mount(
+        "https://",
+        HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=retry),
+    )
+
+
+@st.cache_resource
+def html_session() -> CachedSession:
+    """
+    Sessão das páginas da Amazon, com cache em disco (SQLite) que sobrevive
+    a restart do Streamlit. Fica no cache_resource: uma por processo, então
+    a conexão TCP/TLS é reaproveitada entre reruns.
+    """
+    session = CachedSession(HTML_CACHE_PATH, backend="sqlite", expire_after=600)
+    session.headers.update(HEADERS)
+    _mount_pool(session)
+    return session
+
+
+@st.cache_resource
+def github_session() -> requests.Session:
+    """Sessão (sem cache HTTP) para baixar o scraping.db do GitHub."""
+    session = requests.Session()
+    _mount_pool(session)
+    return session
+
 
-@st.cache_data(show_spinner=False, ttl=600)
 def cached_html(url: str) -> str:
-    resp = requests.get(url, headers=HEADERS, timeout=20)
+    resp = html_session().get(url, timeout=20)
     resp.raise_for_status()
     return resp.text
 
@@ -54,15 +108,41 @@ def cached_html(url: str) -> str:
 # =============================================================================
 
 
+@st.cache_resource
+def _db_snapshot() -> dict:
+    """
+    Último scraping.db baixado: conexões já abertas em memória por versão,
+    ETag/Last-Modified do GitHub e o resumo já pronto. Permite responder um
+    304 sem baixar nem reprocessar o banco, e consultar o histórico depois
+    na conexão da mesma versão que a sessão está exibindo.
+    """
+    return {}
+
+
 @st.cache_data(show_spinner=False, ttl=60)
 def get_data():
     """
-    Baixa SEMPRE o scraping.db do GitHub (RAW) e lê products e prices.
+    Baixa o scraping.db do GitHub (RAW) e devolve (df_products, db_version).
+
+    df_products já traz o resumo de cada produto calculado no SQLite
+    (último preço e data da última coleta); o histórico completo só é lido
+    em get_history, para o produto selecionado.
 
     ttl=60 -> no máximo 1 minuto de defasagem em relação ao GitHub Actions,
-    que está rodando o scraper de 5 em 5 minutos.
+    que está rodando o scraper de 5 em 5 minutos. O GET é condicional: se o
+    arquivo não mudou (304), reaproveita os dados do último download.
     """
-    resp = requests.get(GITHUB_DB_URL, timeout=20)
+    snapshot = _db_snapshot()
+    cond_headers = {}
+    if snapshot.get("etag"):
+        cond_headers["If-None-Match"] = snapshot["etag"]
+    if snapshot.get("last_modified"):
+        cond_headers["If-Modified-Since"] = snapshot["last_modified"]
+
+    resp = github_session().get(GITHUB_DB_URL, headers=cond_headers, timeout=20)
+    if resp.status_code == 304 and "data" in snapshot:
+        return snapshot["data"]
+
     if resp.status_code != 200:
         st.error(
             f"❌ Não foi possível baixar o scraping.db do GitHub "
@@ -70,31 +150,174 @@ def get_data():
         )
         st.stop()
 
-    with open(DB_TEMP_PATH, "wb") as f:
-        f.write(resp.content)
+    db_version = snapshot.get("version", 0) + 1
+    # conexão nova por download; a versão anterior fica para sessões que
+    # ainda estão no meio de um rerun com ela, as mais velhas são liberadas
+    conn = open_db(resp.content)
+    conns = {
+        v: c for v, c in snapshot.get("conns", {}).items() if v == db_version - 1
+    }
+    conns[db_version] = conn
+    snapshot["conns"] = conns
+    data = (load_products(conn), db_version)
+    snapshot.update(
+        etag=resp.headers.get("ETag"),
+        last_modified=resp.headers.get("Last-Modified"),
+        version=db_version,
+        data=data,
+    )
+    return data
 
-    conn = sqlite3.connect(DB_TEMP_PATH)
-    df_products = pd.read_sql_query("SELECT * FROM products", conn)
-    df_prices = pd.read_sql_query("SELECT * FROM prices", conn)
-    conn.close()
 
-    if "date" in df_prices.columns:
-        df_prices["date"] = pd.to_datetime(df_prices["date"])
-        df_prices = df_prices.sort_values("date")
-        # ajusta fuso (caso precise)
-        df_prices["date_local"] = df_prices["date"]  # aqui você ajusta se quiser
-    else:
-        df_prices["date_local"] = pd.NaT
+def open_db(db_bytes: bytes) -> sqlite3.Connection:
+    """
+    Abre o scraping.db baixado direto da memória (Python 3.11+).
+    check_same_thread=False: a conexão fica no cache_resource e é lida pelas
+    threads de todas as sessões (o sqlite3 aqui é compilado em modo serializado).
+    """
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.deserialize(db_bytes)
+    return conn
 
-    return df_products, df_prices
 
+def db_conn(db_version: int) -> sqlite3.Connection:
+    """Conexão com o scraping.db da versão db_version (mantida entre reruns)."""
+    return _db_snapshot()["conns"][db_version]
+
+
+def to_local(dates: pd.Series) -> pd.Series:
+    """
+    Datas UTC (texto ISO do banco) -> horário local, sem tz no final para o
+    gráfico não reconverter para UTC no eixo.
+    """
+    return (
+        pd.to_datetime(dates, utc=True).dt.tz_convert(LOCAL_TZ).dt.tz_localize(None)
+    )
+
+
+def load_products(conn: sqlite3.Connection) -> pd.DataFrame:
+    """Lê products + resumo de preços por produto, tudo resolvido no SQLite."""
+    # last_update é gravado pelo scraper; bancos antigos ainda não têm a coluna
+    product_cols = [row[1] for row in conn.execute("PRAGMA table_info(products)")]
+    last_update_sql = "p.last_update" if "last_update" in product_cols else "NULL"
+
+    # subconsultas usam o índice (product_id, date, price): não trazem o histórico
+    df_products = pd.read_sql_query(
+        f"""
+        SELECT
+            p.id, p.name, p.url, p.image_url,
+            {last_update_sql} AS last_update,
+            (
+                SELECT price FROM prices
+                WHERE product_id = p.id AND price IS NOT NULL
+                ORDER BY date DESC LIMIT 1
+            ) AS last_price,
+            (SELECT MAX(date) FROM prices WHERE product_id = p.id) AS last_date
+        FROM products p
+        """,
+        conn,
+        dtype={"id": "int32"},
+    )
+
+    # id como índice: busca do produto selecionado vira lookup direto
+    df_products = df_products.set_index("id", drop=False)
+    df_products["last_update"] = to_local(df_products["last_update"])
+    df_products["last_date"] = to_local(df_products["last_date"])
+    return df_products
 
-def get_latest_price(df_prices: pd.DataFrame, product_id: int):
-    df_prod = df_prices[df_prices["product_id"] == product_id]
-    df_prod = df_prod.dropna(subset=["price"])
-    if df_prod.empty:
-        return None
-    return df_prod["price"].iloc[-1]
+
+# uma entrada por produto aberto; max_entries evita crescer sem limite
+@st.cache_data(show_spinner=False, max_entries=HISTORY_CACHE_ENTRIES)
+def get_history(
+    product_id: int, db_version: int, _conn: sqlite3.Connection
+) -> pd.DataFrame:
+    """
+    Histórico de preços de um produto, em ordem de data.
+    db_version entra na chave do cache: banco novo -> consulta nova. _conn é
+    a conexão dessa mesma versão (fica fora da chave, prefixo _), para o
+    cache nunca guardar linhas de um banco mais novo na chave de um antigo.
+    """
+    df_prod = pd.read_sql_query(
+        "SELECT date, price FROM prices WHERE product_id = ? ORDER BY date",
+        _conn,
+        params=(int(product_id),),
+    )
+
+    df_prod["date_local"] = to_local(df_prod["date"])
+    return df_prod
+
+
+# =============================================================================
+# FUNÇÕES DE GRÁFICO
+# =============================================================================
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: escolhe n_out índices que preservam
+    o formato visual da série (picos e vales), sempre mantendo o primeiro
+    e o último ponto.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    bucket = (n - 2) / (n_out - 2)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0] = 0
+    idx[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * bucket) + 1
+        end = int((i + 1) * bucket) + 1
+        next_end = min(int((i + 2) * bucket) + 1, n)
+
+        # média do próximo bucket = terceiro vértice do triângulo
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        idx[i + 1] = a
+
+    return idx
+
+
+@st.cache_data(show_spinner=False, max_entries=HISTORY_CACHE_ENTRIES)
+def chart_points(
+    product_id: int, last_ts, n_points: int, _df_valid: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Pontos (date_local, price) enviados ao gráfico do navegador.
+
+    O cache é por (produto, último timestamp, nº de pontos): só recalcula
+    quando chega preço novo. _df_valid fica fora da chave (prefixo _).
+    """
+    df_plot = _df_valid[["date_local", "price"]]
+    # histórico longo: reduz os pontos antes de mandar para o frontend
+    if len(df_plot) > LTTB_THRESHOLD:
+        dates = df_plot["date_local"]
+        elapsed = (dates - dates.iloc[0]).dt.total_seconds().to_numpy()
+        keep = lttb_indices(elapsed, df_plot["price"].to_numpy(), LTTB_POINTS)
+        df_plot = df_plot.iloc[keep]
+    return df_plot.reset_index(drop=True)
+
+
+@st.cache_data(show_spinner=False, max_entries=HISTORY_CACHE_ENTRIES)
+def price_stats(
+    product_id: int, last_ts, n_points: int, _df_valid: pd.DataFrame
+) -> tuple[float, float, float, float]:
+    """
+    (primeiro, último, mínimo, máximo) do histórico válido de um produto.
+    Mesma chave do gráfico: só recalcula quando chega preço novo.
+    """
+    # um buffer numpy contíguo: reduções direto nele, sem passar pelo pandas
+    arr = _df_valid["price"].to_numpy()
+    return float(arr[0]), float(arr[-1]), float(arr.min()), float(arr.max())
 
 
 # =============================================================================
@@ -102,6 +325,22 @@ def get_latest_price(df_prices: pd.DataFrame, product_id: int):
 # =============================================================================
 
 
+_HIRES_RE = re.compile(r'"hiRes":"([^"]+)"')
+
+# atalho sem DOM para o caso comum: a tag <img id="landingImage" ... src="...">
+_LANDING_IMG_TAG_RE = re.compile(
+    r'<img\b[^>]*\bid="landingImage"[^>]*>', re.IGNORECASE
+)
+_SRC_ATTR_RE = re.compile(r'(?<![\w-])src="([^"]+)"')
+
+# uma única varredura no DOM: pega todos os nós candidatos a imagem principal
+_IMAGE_NODES_XPATH = etree.XPath(
+    "//*[self::img[@id='landingImage' or @data-old-hires or @data-a-dynamic-image"
+    " or contains(@src, 'images/I/')]"
+    " or self::meta[@property='og:image']]"
+)
+
+
 def get_product_image(url: str) -> str | None:
     """Tenta achar a imagem principal da Amazon (somente leitura)."""
     try:
@@ -109,52 +348,148 @@ def get_product_image(url: str) -> str | None:
     except Exception:
         return None
 
-    soup = BeautifulSoup(html, "html.parser")
+    # 1) landingImage direto no HTML cru: evita montar o DOM da página toda
+    tag = _LANDING_IMG_TAG_RE.search(html)
+    if tag:
+        src = _SRC_ATTR_RE.search(tag.group(0))
+        if src:
+            return unescape(src.group(1))
+
+    try:
+        tree = lxml_html.fromstring(html)
+    except Exception:
+        return None
+
+    # guarda o primeiro nó de cada estratégia; a prioridade é aplicada depois
+    found = {}
+    for node in _IMAGE_NODES_XPATH(tree):
+        if node.tag == "meta":
+            found.setdefault("og_image", node.get("content"))
+            continue
+        if node.get("id") == "landingImage":
+            found.setdefault("landing", node.get("src"))
+        if node.get("data-old-hires") is not None:
+            found.setdefault("old_hires", node.get("data-old-hires"))
+        if node.get("data-a-dynamic-image") is not None:
+            found.setdefault("dynamic", node.get("data-a-dynamic-image"))
+        if "images/I/" in (node.get("src") or ""):
+            found.setdefault("any_img", node.get("src"))
 
     # 1) landingImage
-    img = soup.find("img", {"id": "landingImage"})
-    if img and img.get("src"):
-        return img["src"]
+    if found.get("landing"):
+        return found["landing"]
 
     # 2) data-old-hires
-    img = soup.find("img", attrs={"data-old-hires": True})
-    if img and img.get("data-old-hires"):
-        return img["data-old-hires"]
+    if found.get("old_hires"):
+        return found["old_hires"]
 
     # 3) data-a-dynamic-image
-    img = soup.find("img", attrs={"data-a-dynamic-image": True})
-    if img and img.get("data-a-dynamic-image"):
+    if found.get("dynamic"):
         try:
-            dyn = json.loads(img["data-a-dynamic-image"])
-            urls = list(dyn.keys())
-            for u in urls:
+            dyn = json.loads(found["dynamic"])
+            for u in dyn:
                 if "images/I/" in u or "m.media-amazon.com" in u:
                     return u
-            if urls:
-                return urls[0]
+            first = next(iter(dyn), None)
+            if first:
+                return first
         except Exception:
             pass
 
     # 4) meta og:image
-    meta = soup.find("meta", {"property": "og:image"})
-    if meta and meta.get("content"):
-        return meta["content"]
+    if found.get("og_image"):
+        return found["og_image"]
 
     # 5) qualquer img com /images/I/
-    any_img = soup.find("img", src=lambda x: x and "images/I/" in x)
-    if any_img and any_img.get("src"):
-        return any_img["src"]
+    if found.get("any_img"):
+        return found["any_img"]
 
-    # 6) script com "hiRes"
-    for script in soup.find_all("script"):
-        if script.string and "hiRes" in script.string:
-            m = re.search(r'"hiRes":"(.*?)"', script.string)
-            if m:
-                return m.group(1).replace("\\/", "/")
+    # 6) "hiRes" dos scripts: regex direto no HTML cru, sem percorrer <script>
+    m = _HIRES_RE.search(html)
+    if m:
+        return m.group(1).replace("\\/", "/")
 
     return None
 
 
+def cached_product_image(url: str) -> str | None:
+    """
+    get_product_image com cache em disco (SQLite), que sobrevive a restart
+    do Streamlit: só raspa a página de novo depois de IMAGE_CACHE_TTL.
+    """
+    # conexão por chamada: roda nas threads do prefetch (tabela criada em
+    # _image_prefetcher, antes de qualquer busca)
+    conn = sqlite3.connect(IMAGE_CACHE_PATH, timeout=10)
+    try:
+        row = conn.execute(
+            "SELECT image_url, fetched_at FROM images WHERE url = ?", (url,)
+        ).fetchone()
+        if row and time.time() - row[1] < IMAGE_CACHE_TTL:
+            return row[0]
+
+        image_url = get_product_image(url)
+        # só guarda acerto: falha tenta de novo na próxima execução
+        if image_url:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO images (url, image_url, fetched_at) "
+                    "VALUES (?, ?, ?)",
+                    (url, image_url, time.time()),
+                )
+        return image_url
+    finally:
+        conn.close()
+
+
+@st.cache_resource
+def _image_prefetcher():
+    """
+    Executor + jobs (url -> (Future, horário do envio)) das imagens buscadas
+    em segundo plano. Fica no cache_resource para sobreviver aos reruns; cria
+    a tabela do cache de imagens uma vez por processo.
+    """
+    conn = sqlite3.connect(IMAGE_CACHE_PATH, timeout=10)
+    try:
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS images (url TEXT PRIMARY KEY, "
+                "image_url TEXT NOT NULL, fetched_at REAL NOT NULL)"
+            )
+    finally:
+        conn.close()
+    return ThreadPoolExecutor(max_workers=4), {}
+
+
+def _failed(fut) -> bool:
+    """Busca terminada sem imagem (erro ou None)."""
+    return fut.done() and (fut.exception() is not None or fut.result() is None)
+
+
+def prefetch_images(urls) -> None:
+    """
+    Dispara em segundo plano a busca das imagens ainda não pedidas.
+    Busca que falhou é reenviada depois de IMAGE_RETRY_INTERVAL segundos.
+    """
+    executor, jobs = _image_prefetcher()
+    now = time.time()
+    for url in urls:
+        job = jobs.get(url)
+        if job is not None:
+            fut, submitted_at = job
+            if not _failed(fut) or now - submitted_at < IMAGE_RETRY_INTERVAL:
+                continue
+        jobs[url] = (executor.submit(cached_product_image, url), now)
+
+
+def ready_image(url: str) -> str | None:
+    """Imagem já encontrada em segundo plano, ou None se ainda não chegou."""
+    _, jobs = _image_prefetcher()
+    job = jobs.get(url)
+    if job is None or not job[0].done() or _failed(job[0]):
+        return None
+    return job[0].result()
+
+
 # =============================================================================
 # CONFIG STREAMLIT + CSS
 # =============================================================================
@@ -165,8 +500,8 @@ st.set_page_config(
     page_icon="💹",
 )
 
-st.markdown(
-    """
+# CSS da página: minificado uma vez por processo e reenviado a cada rerun
+PAGE_CSS = """
     <style>
     .main {
         background: radial-gradient(circle at top left, #111827, #020617);
@@ -420,9 +755,18 @@ st.markdown(
     }
 
     </style>
-    """,
-    unsafe_allow_html=True,
-)
+"""
+
+
+@st.cache_resource
+def _page_css() -> str:
+    """PAGE_CSS sem comentários e espaços: menos bytes no websocket a cada rerun."""
+    css = re.sub(r"/\*.*?\*/", "", PAGE_CSS, flags=re.DOTALL)
+    css = re.sub(r"\s+", " ", css).replace(": ", ":")
+    return re.sub(r"\s*([{};,>])\s*", r"\1", css).strip()
+
+
+st.markdown(_page_css(), unsafe_allow_html=True)
 
 # =============================================================================
 # SIDEBAR – INFORMAÇÕES / ASSINATURA (SEM CADASTRO)
@@ -464,16 +808,18 @@ with st.sidebar:
 # CONTEÚDO PRINCIPAL
 # =============================================================================
 
-df_products, df_prices = get_data()
+df_products, db_version = get_data()
 
-# Última atualização (baseada na última linha de prices.date_local)
-if not df_prices.empty and "date_local" in df_prices.columns:
-    last_dt = df_prices["date_local"].max()
-    last_str = (
-        last_dt.strftime("%d/%m %H:%M") if pd.notna(last_dt) else "--/-- --:--"
-    )
-else:
-    last_str = "--/-- --:--"
+# produtos sem imagem salva: busca na Amazon fora do render
+prefetch_images(df_products.loc[df_products["image_url"].isna(), "url"])
+
+# Última atualização: products.last_update (um valor por produto) em vez de
+# varrer todo o histórico de prices; em banco antigo usa a última coleta
+# de cada produto (já resumida no SQL)
+last_dt = df_products["last_update"].max()
+if pd.isna(last_dt):
+    last_dt = df_products["last_date"].max()
+last_str = last_dt.strftime("%d/%m %H:%M") if pd.notna(last_dt) else "--/-- --:--"
 
 header_col1, header_col2 = st.columns([3, 1])
 with header_col1:
@@ -486,7 +832,17 @@ with header_col1:
         """,
         unsafe_allow_html=True,
     )
-
+with header_col2:
+    st.markdown(
+        f"""
+        <div style="display:flex; justify-content:flex-end;">
+            <div class="last-update-pill">
+                Última atualização: <strong>{last_str}</strong>
+            </div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
 
 
 if df_products.empty:
@@ -496,108 +852,122 @@ if df_products.empty:
     )
     st.stop()
 
-sns.set_style("whitegrid")
-
 # ----------------------------------------------------------------------------- #
 # CARD DE DETALHES – CENTRALIZADO (SOMENTE LEITURA)
 # ----------------------------------------------------------------------------- #
 
-selected_id = st.session_state.get("selected_product_id")
 
-if selected_id is not None and selected_id in df_products["id"].values:
-    product = df_products[df_products["id"] == selected_id].iloc[0]
-    df_prod = df_prices[df_prices["product_id"] == selected_id].copy()
+# ?pid=<id> na URL abre direto o card de detalhes (link compartilhável)
+if "selected_product_id" not in st.session_state:
+    pid = st.query_params.get("pid", "")
+    st.session_state["selected_product_id"] = int(pid) if pid.isdigit() else None
 
-    st.markdown("### Detalhes do produto selecionado")
 
-    _, center_col, _ = st.columns([1, 2, 1])
-    with center_col:
-        with st.container():
-            st.markdown(
-                '<div class="detail-card-flag"></div>',
-                unsafe_allow_html=True,
-            )
+def _close_detail() -> None:
+    st.session_state["selected_product_id"] = None
+    st.query_params.pop("pid", None)
 
-            top_cols = st.columns([5, 1])
-            with top_cols[0]:
-                st.markdown(f"**{product['name']}**")
-            with top_cols[1]:
-                if st.button("✕ Fechar", key="close_detail"):
-                    st.session_state["selected_product_id"] = None
-                    st.rerun()
 
-            img_col, info_col = st.columns([1, 1])
-            with img_col:
-                img_url = product.get("image_url")
-                if not img_url:
-                    img_url = get_product_image(product["url"])
+@st.fragment
+def render_detail(
+    df_products: pd.DataFrame, db_version: int, conn: sqlite3.Connection
+) -> None:
+    """
+    Card do produto selecionado. Como fragmento, o "Fechar" reroda só este
+    trecho, sem redesenhar o grid. conn é a conexão da versão db_version:
+    o rerun do fragmento reaproveita os argumentos e continua consistente.
+    """
+    selected_id = st.session_state.get("selected_product_id")
 
-                if img_url:
-                    st.image(img_url, width=170)
-                else:
-                    st.info("Sem imagem disponível.")
-            with info_col:
-                st.markdown(f"[Ver na Amazon]({product['url']})")
-
-            st.markdown("---")
-            st.write("**Histórico de preços**")
-
-            if df_prod.empty:
-                st.info("Sem histórico ainda para este produto.")
-            else:
-                fig, ax = plt.subplots(figsize=(4.5, 2.2))
-                sns.lineplot(
-                    data=df_prod,
-                    x="date_local",
-                    y="price",
-                    marker="o",
-                    ax=ax,
-                )
-                ax.set_xlabel("Data/Hora", fontsize=7)
-                ax.set_ylabel("Preço (R$)", fontsize=7)
-                ax.tick_params(axis="both", labelsize=7)
-                ax.xaxis.set_major_formatter(
-                    mdates.DateFormatter("%d/%m\n%H:%M")
+    if selected_id is not None and selected_id in df_products.index:
+        product = df_products.loc[selected_id]
+        df_prod = get_history(selected_id, db_version, conn)
+
+        st.markdown("### Detalhes do produto selecionado")
+
+        _, center_col, _ = st.columns([1, 2, 1])
+        with center_col:
+            with st.container():
+                st.markdown(
+                    '<div class="detail-card-flag"></div>',
+                    unsafe_allow_html=True,
                 )
-                plt.tight_layout()
-                st.pyplot(fig)
-
-                df_valid = df_prod.dropna(subset=["price"])
-                if len(df_valid) >= 2:
-                    first_price = df_valid["price"].iloc[0]
-                    last_price = df_valid["price"].iloc[-1]
-                    max_price = df_valid["price"].max()
-                    min_price = df_valid["price"].min()
-                    diff_abs = last_price - first_price
-
-                    if diff_abs > 0:
-                        tendencia = "subiu"
-                        badge_class = "positive"
-                    elif diff_abs < 0:
-                        tendencia = "caiu"
-                        badge_class = "negative"
+
+                top_cols = st.columns([5, 1])
+                with top_cols[0]:
+                    st.markdown(f"**{product['name']}**")
+                with top_cols[1]:
+                    # callback roda antes do rerun do fragmento: o card já some
+                    st.button("✕ Fechar", key="close_detail", on_click=_close_detail)
+
+                img_col, info_col = st.columns([1, 1])
+                with img_col:
+                    img_url = product["image_url"]
+                    if not img_url:
+                        img_url = ready_image(product["url"])
+
+                    if img_url:
+                        st.image(img_url, width=170)
                     else:
-                        tendencia = "estável"
-                        badge_class = "neutral"
-
-                    st.markdown(
-                        f"""
-                        <span class="metric-badge {badge_class}">
-                            Tendência: {tendencia}
-                        </span>
-                        <span class="metric-badge">
-                            Atual: R$ {last_price:.2f}
-                        </span>
-                        <span class="metric-badge">
-                            Mín: R$ {min_price:.2f}
-                        </span>
-                        <span class="metric-badge">
-                            Máx: R$ {max_price:.2f}
-                        </span>
-                        """,
-                        unsafe_allow_html=True,
+                        st.info("Sem imagem disponível.")
+                with info_col:
+                    st.markdown(f"[Ver na Amazon]({product['url']})")
+
+                st.markdown("---")
+                st.write("**Histórico de preços**")
+
+                if df_prod.empty:
+                    st.info("Sem histórico ainda para este produto.")
+                else:
+                    df_valid = df_prod.dropna(subset=["price"])
+                    last_ts = df_valid["date_local"].iat[-1] if len(df_valid) else None
+                    # desenhado no navegador (Vega-Lite): o servidor só manda os pontos
+                    st.line_chart(
+                        chart_points(selected_id, last_ts, len(df_valid), df_valid),
+                        x="date_local",
+                        y="price",
+                        x_label="Data/Hora",
+                        y_label="Preço (R$)",
+                        height=240,
                     )
 
+                    if len(df_valid) >= 2:
+                        first_price, last_price, min_price, max_price = price_stats(
+                            selected_id, last_ts, len(df_valid), df_valid
+                        )
+                        diff_abs = last_price - first_price
+
+                        if diff_abs > 0:
+                            tendencia = "subiu"
+                            badge_class = "positive"
+                        elif diff_abs < 0:
+                            tendencia = "caiu"
+                            badge_class = "negative"
+                        else:
+                            tendencia = "estável"
+                            badge_class = "neutral"
+
+                        st.markdown(
+                            f"""
+                            <span class="metric-badge {badge_class}">
+                                Tendência: {tendencia}
+                            </span>
+                            <span class="metric-badge">
+                                Atual: R$ {last_price:.2f}
+                            </span>
+                            <span class="metric-badge">
+                                Mín: R$ {min_price:.2f}
+                            </span>
+                            <span class="metric-badge">
+                                Máx: R$ {max_price:.2f}
+                            </span>
+                            """,
+                            unsafe_allow_html=True,
+                        )
+
+
+render_detail(df_products, db_version, db_conn(db_version))
+
 # ----------------------------------------------------------------------------- #
 # GRID DE CARDS – PRODUTOS MONITORADOS
 # ----------------------------------------------------------------------------- #
@@ -607,64 +977,69 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-cols = st.columns(3, gap="large")
-
-for idx, (_, product) in enumerate(df_products.iterrows()):
-    col = cols[idx % 3]
 
-    with col:
-        with st.container():
-            st.markdown(
-                '<div class="product-card-flag"></div>',
-                unsafe_allow_html=True,
+@st.fragment
+def render_grid(df_products: pd.DataFrame) -> None:
+    """
+    Paginação + cards. Como fragmento, trocar de página reroda só o grid.
+    """
+    # paginação: só renderiza os cards da página atual
+    total_pages = max(1, math.ceil(len(df_products) / PAGE_SIZE))
+    if total_pages > 1:
+        page = int(
+            st.number_input(
+                "Página", min_value=1, max_value=total_pages, value=1, step=1
             )
+        )
+    else:
+        page = 1
 
-            st.markdown(
-                f'<div class="product-title">{product["name"]}</div>',
-                unsafe_allow_html=True,
-            )
+    df_page = df_products.iloc[(page - 1) * PAGE_SIZE : page * PAGE_SIZE]
 
-            img_url = product.get("image_url")
-            if not img_url:
-                img_url = get_product_image(product["url"])
+    cols = st.columns(3, gap="large")
 
-            st.markdown(
-                '<div class="product-image-wrapper">',
-                unsafe_allow_html=True,
-            )
-            if img_url:
-                st.image(img_url, use_column_width=False, width=230)
-            else:
-                st.markdown(
-                    '<div class="product-image-placeholder">Imagem indisponível</div>',
-                    unsafe_allow_html=True,
-                )
-            st.markdown("</div>", unsafe_allow_html=True)
+    for idx, product in enumerate(df_page.itertuples(index=False)):
+        col = cols[idx % 3]
 
-            latest_price = get_latest_price(df_prices, product["id"])
-            st.markdown(
-                '<div class="product-card-footer">',
-                unsafe_allow_html=True,
-            )
-            if latest_price is not None:
-                st.markdown(
-                    f'<span class="product-price-badge">💰 R$ {latest_price:.2f}</span>',
-                    unsafe_allow_html=True,
-                )
-            else:
+        with col:
+            with st.container():
+                img_url = product.image_url
+                if not img_url:
+                    img_url = ready_image(product.url)
+
+                if img_url:
+                    # <img> direto: o navegador baixa da Amazon, sem passar pelo
+                    # servidor; a URL vem raspada (e já unescape-ada), então
+                    # escapa de novo
+                    src = escape(img_url, quote=True)
+                    image_html = f'<img src="{src}" width="230"/>'
+                else:
+                    image_html = (
+                        '<div class="product-image-placeholder">Imagem indisponível</div>'
+                    )
+
+                latest_price = product.last_price
+                if pd.notna(latest_price):
+                    price_html = f"💰 R$ {latest_price:.2f}"
+                else:
+                    price_html = "Sem preço ainda"
+
+                # card inteiro num único markdown: uma mensagem por card, não ~10
                 st.markdown(
-                    '<span class="product-price-badge">Sem preço ainda</span>',
+                    '<div class="product-card-flag"></div>'
+                    f'<div class="product-title">{product.name}</div>'
+                    f'<div class="product-image-wrapper">{image_html}</div>'
+                    '<div class="product-card-footer">'
+                    f'<span class="product-price-badge">{price_html}</span>'
+                    "</div>",
                     unsafe_allow_html=True,
                 )
-            st.markdown("</div>", unsafe_allow_html=True)
 
-            st.markdown(
-                '<div class="product-actions-row">',
-                unsafe_allow_html=True,
-            )
-            b1, _ = st.columns(2)
-            with b1:
-                if st.button("Ver detalhes", key=f"view_{product['id']}"):
-                    st.session_state["selected_product_id"] = product["id"]
+                if st.button("Ver detalhes", key=f"view_{product.id}"):
+                    st.session_state["selected_product_id"] = product.id
+                    st.query_params["pid"] = str(product.id)
+                    # o card de detalhes fica fora do fragmento: rerun do app todo
                     st.rerun()
-            st.markdown("</div>", unsafe_allow_html=True)
+
+
+render_grid(df_products)
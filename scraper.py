@@ -1,10 +1,15 @@
+import hashlib
 import sqlite3
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 import statistics
 
 import requests
-from bs4 import BeautifulSoup
+from lxml import etree
+from lxml import html as lxml_html
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from utils import extract_price
 
@@ -26,21 +31,49 @@ HEADERS = {
 # Ativa ou não o filtro de outlier por histórico
 USE_OUTLIER_FILTER = True
 
+# Quantos produtos buscar em paralelo (poucos, para não irritar a Amazon)
+MAX_WORKERS = 4
+
+# Sessão compartilhada pelas threads: reaproveita a conexão TCP/TLS com a
+# Amazon entre produtos e tentativas (keep-alive), um slot por worker.
+# Um único host -> um pool; pool_block faz a thread esperar uma conexão
+# livre em vez de abrir (e descartar) conexões extras além do pool.
+# O retry do adapter cobre só falha de conexão; as tentativas "de verdade"
+# continuam em get_price_with_retries.
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=MAX_WORKERS,
+        pool_block=True,
+        max_retries=Retry(total=2, backoff_factor=0.5, status=0),
+    ),
+)
+
 
 # =============================================================================
 # BANCO / SCHEMA
 # =============================================================================
 
 def get_conn():
-    return sqlite3.connect(DB_NAME)
-
-
-def ensure_schema():
+    conn = sqlite3.connect(DB_NAME)
+    # cache de páginas maior (~8 MB) e leitura via mmap (até 256 MB).
+    # journal_mode fica no padrão (DELETE): o scraping.db vai para o git e o
+    # dashboard o abre com deserialize, que não lê banco marcado como WAL.
+    conn.execute("PRAGMA cache_size = -8192")
+    conn.execute("PRAGMA mmap_size = 268435456")
+    # tabelas/índices temporários (ORDER BY, índices automáticos) em memória
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def ensure_schema(conn: sqlite3.Connection):
     """
     Garante que as tabelas products e prices existam.
     Não apaga nada, só cria se não existir.
     """
-    conn = get_conn()
     cur = conn.cursor()
 
     cur.execute(
@@ -49,11 +82,18 @@ def ensure_schema():
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
             url TEXT NOT NULL,
-            image_url TEXT
+            image_url TEXT,
+            last_update TEXT
         )
         """
     )
 
+    # bancos antigos: adiciona last_update (horário UTC da última coleta)
+    cur.execute("PRAGMA table_info(products)")
+    cols = [row[1] for row in cur.fetchall()]
+    if "last_update" not in cols:
+        cur.execute("ALTER TABLE products ADD COLUMN last_update TEXT")
+
     cur.execute(
         """
         CREATE TABLE IF NOT EXISTS prices (
@@ -66,8 +106,18 @@ def ensure_schema():
         """
     )
 
+    # índices para histórico por produto e busca por URL.
+    # (product_id, date, price) cobre as consultas de histórico/estatística:
+    # o SQLite responde só pelo índice, sem ir na tabela. Substitui o antigo
+    # (product_id, date), que ficaria redundante.
+    cur.execute("DROP INDEX IF EXISTS idx_prices_product_date")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_prices_product_date_price "
+        "ON prices(product_id, date, price)"
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_products_url ON products(url)")
+
     conn.commit()
-    conn.close()
 
 
 # =============================================================================
@@ -157,53 +207,114 @@ def fetch_html(url: str, timeout: int = 25) -> str | None:
     Retorna None em caso de erro.
     """
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=timeout)
+        resp = SESSION.get(url, timeout=timeout)
         resp.raise_for_status()
+        # sem charset no Content-Type, o requests assume ISO-8859-1 para
+        # text/html (ou roda a detecção de encoding se nem houver
+        # Content-Type) e estraga "R$"/acentos; a Amazon serve UTF-8
+        if "charset" not in resp.headers.get("Content-Type", "").lower():
+            return resp.content.decode("utf-8", errors="replace")
         return resp.text
     except Exception as e:
         print(f"[ERRO] Falha ao buscar HTML de {url}: {e}")
         return None
 
 
+def _class_xpath(tag: str, cls: str) -> str:
+    """XPath equivalente ao seletor CSS tag.cls (classe como token inteiro)."""
+    return f"{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')]"
+
+
+# XPaths compiladas uma vez só (equivalentes aos seletores CSS de antes)
+_PRICE_WHOLE_XPATH = etree.XPath(".//" + _class_xpath("span", "a-price-whole"))
+_PRICE_FRACTION_XPATH = etree.XPath(".//" + _class_xpath("span", "a-price-fraction"))
+
+# 1) blocos de preço principais (desktop / corePrice), na ordem de prioridade
+_PRICE_CONTAINER_IDS = [
+    "corePriceDisplay_desktop_feature_div",
+    "corePrice_feature_div",
+    "price",
+]
+# 3) IDs clássicos da Amazon (só em <span>)
+_CLASSIC_PRICE_SPAN_IDS = [
+    "priceblock_ourprice",
+    "priceblock_dealprice",
+    "priceblock_saleprice",
+    "corePrice_feature_div",
+]
+# 1) + 3): uma única varredura pega todos os nós identificados por id
+_ID_NODES_XPATH = etree.XPath(
+    "//*[@id='corePriceDisplay_desktop_feature_div' or @id='corePrice_feature_div'"
+    " or @id='price' or @id='priceblock_ourprice' or @id='priceblock_dealprice'"
+    " or @id='priceblock_saleprice' or (self::div and @data-feature-name='corePrice')]"
+)
+# 2) qualquer .a-price na página, em ordem de documento
+_ANY_PRICE_BLOCK_XPATH = etree.XPath(
+    "//*[self::span or self::div]"
+    "[contains(concat(' ', normalize-space(@class), ' '), ' a-price ')]"
+)
+# 4) + 5): uma varredura pelos .a-offscreen; o ancestral .a-price é testado
+#    só nos nós encontrados, até o primeiro que bater
+_OFFSCREEN_NODES_XPATH = etree.XPath(
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' a-offscreen ')]"
+)
+_HAS_PRICE_ANCESTOR_XPATH = etree.XPath(
+    "boolean(ancestor::"
+    "*[contains(concat(' ', normalize-space(@class), ' '), ' a-price ')])"
+)
+# 6) texto visível da página (sem script/style)
+_PAGE_TEXT_XPATH = etree.XPath(
+    "//text()[not(ancestor::script) and not(ancestor::style)]"
+)
+
+
+def _first(xpath: etree.XPath, node, **kwargs):
+    found = xpath(node, **kwargs)
+    return found[0] if found else None
+
+
 def _parse_price_from_price_block(block) -> float | None:
     """
     Dado um 'bloco de preço' (div/span com a estrutura da Amazon),
     monta o valor usando:
         - span.a-price-whole (parte inteira, com ponto de milhar)
         - span.a-price-fraction (centavos)
-    e converte com extract_price.
+    e converte para float.
 
     Retorna float ou None.
     """
     if block is None:
         return None
 
-    whole_span = block.select_one("span.a-price-whole")
-    if not whole_span:
+    whole_span = _first(_PRICE_WHOLE_XPATH, block)
+    if whole_span is None:
         return None
 
-    fraction_span = block.select_one("span.a-price-fraction")
+    fraction_span = _first(_PRICE_FRACTION_XPATH, block)
 
     # Pega apenas dígitos da parte inteira (remove ponto, vírgula e espaços)
-    whole_raw = whole_span.get_text(strip=True)
+    whole_raw = whole_span.text_content().strip()
     whole_digits = "".join(ch for ch in whole_raw if ch.isdigit())
 
     if not whole_digits:
         return None
 
-    if fraction_span:
-        fraction_raw = fraction_span.get_text(strip=True)
+    if fraction_span is not None:
+        fraction_raw = fraction_span.text_content().strip()
         fraction_digits = "".join(ch for ch in fraction_raw if ch.isdigit())
         if not fraction_digits:
             fraction_digits = "00"
     else:
         fraction_digits = "00"
 
-    # Monta string estilo BR: R$ 2116,05
-    price_str = f"R$ {whole_digits},{fraction_digits}"
+    # Só dígitos dos dois lados: converte direto, sem passar pelo
+    # extract_price (regex + lista de candidatos para um número só)
+    try:
+        price = float(f"{whole_digits}.{fraction_digits}")
+    except ValueError:
+        return None
 
-    price = extract_price(price_str)
-    if price is not None and price > 1:
+    if price > 1:
         return price
 
     return None
@@ -217,59 +328,70 @@ def parse_price_from_html(html: str) -> float | None:
       - Coleta TODOS os preços possíveis em uma lista (candidates).
       - No final, retorna o MENOR preço válido encontrado.
       - Isso evita pegar preço antigo de 2k quando o atual é 158.
+
+    O parse é feito direto no lxml (C) com XPaths pré-compiladas, sem a
+    camada Python do BeautifulSoup por cima.
     """
-    soup = BeautifulSoup(html, "html.parser")
+    try:
+        tree = lxml_html.fromstring(html)
+    except ValueError:
+        # str com declaração <?xml encoding=...?>: o lxml só aceita em bytes
+        tree = lxml_html.fromstring(html.encode("utf-8"))
+    except etree.ParserError:
+        return None
+
     candidates: list[float] = []
 
+    # guarda o primeiro nó de cada id (e do div corePrice); a prioridade
+    # e o filtro de tag são aplicados depois
+    containers = {}
+    classic_spans = {}
+    for node in _ID_NODES_XPATH(tree):
+        node_id = node.get("id")
+        containers.setdefault(node_id, node)
+        if node.tag == "span":
+            classic_spans.setdefault(node_id, node)
+        if node.tag == "div" and node.get("data-feature-name") == "corePrice":
+            containers.setdefault("data-feature-name=corePrice", node)
+
     # 1) Blocos de preço principais (desktop / corePrice)
-    price_containers_selectors = [
-        "#corePriceDisplay_desktop_feature_div",
-        "#corePrice_feature_div",
-        "#price",
-        "div[data-feature-name='corePrice']",
-    ]
-
-    for sel in price_containers_selectors:
-        block = soup.select_one(sel)
-        price = _parse_price_from_price_block(block)
+    for key in _PRICE_CONTAINER_IDS + ["data-feature-name=corePrice"]:
+        price = _parse_price_from_price_block(containers.get(key))
         if price is not None and price > 1:
             candidates.append(price)
 
     # 2) Qualquer .a-price na página (todos os blocos)
-    for block in soup.select("span.a-price, div.a-price"):
+    for block in _ANY_PRICE_BLOCK_XPATH(tree):
         price = _parse_price_from_price_block(block)
         if price is not None and price > 1:
             candidates.append(price)
 
     # 3) IDs clássicos da Amazon (fallback antigo)
-    for span_id in [
-        "priceblock_ourprice",
-        "priceblock_dealprice",
-        "priceblock_saleprice",
-        "corePrice_feature_div",
-    ]:
-        span = soup.find("span", id=span_id)
-        if span and span.get_text(strip=True):
-            price = extract_price(span.get_text())
+    for span_id in _CLASSIC_PRICE_SPAN_IDS:
+        span = classic_spans.get(span_id)
+        if span is not None and span.text_content().strip():
+            price = extract_price(span.text_content())
             if price is not None and price > 1:
                 candidates.append(price)
 
+    offscreen_nodes = _OFFSCREEN_NODES_XPATH(tree)
+
     # 4) Estrutura nova: .a-price .a-offscreen
-    span = soup.select_one(".a-price .a-offscreen")
-    if span and span.get_text(strip=True):
-        price = extract_price(span.get_text())
+    span = next((n for n in offscreen_nodes if _HAS_PRICE_ANCESTOR_XPATH(n)), None)
+    if span is not None and span.text_content().strip():
+        price = extract_price(span.text_content())
         if price is not None and price > 1:
             candidates.append(price)
 
     # 5) Qualquer span com a classe a-offscreen
-    span = soup.select_one("span.a-offscreen")
-    if span and span.get_text(strip=True):
-        price = extract_price(span.get_text())
+    span = next((n for n in offscreen_nodes if n.tag == "span"), None)
+    if span is not None and span.text_content().strip():
+        price = extract_price(span.text_content())
         if price is not None and price > 1:
             candidates.append(price)
 
     # 6) Fallback extremo: usa todo o texto da página
-    text = soup.get_text(" ", strip=True)
+    text = " ".join(t.strip() for t in _PAGE_TEXT_XPATH(tree) if t.strip())
     price = extract_price(text)
     if price is not None and price > 1:
         candidates.append(price)
@@ -288,6 +410,10 @@ def get_price_with_retries(url: str,
     Tenta extrair o preço de uma URL da Amazon com algumas tentativas.
     Só retorna preço > 1. Se falhar, retorna None.
     """
+    # hash das páginas que já falharam: se a Amazon devolver o mesmo corpo
+    # de novo (captcha, página de erro), não precisa parsear outra vez
+    failed_pages: set[bytes] = set()
+
     for i in range(1, attempts + 1):
         print(f"  [INFO] Tentativa {i} para {url}")
         html = fetch_html(url)
@@ -295,11 +421,18 @@ def get_price_with_retries(url: str,
             time.sleep(delay)
             continue
 
+        page_hash = hashlib.blake2b(html.encode(), digest_size=16).digest()
+        if page_hash in failed_pages:
+            print("  [WARN] Mesma página da tentativa anterior, tentando de novo...")
+            time.sleep(delay)
+            continue
+
         price = parse_price_from_html(html)
         if price is not None and price > 1:
             print(f"  [OK] Preço encontrado bruto (menor da página): R$ {price:.2f}")
             return float(round(price, 2))
 
+        failed_pages.add(page_hash)
         print("  [WARN] Preço não encontrado ou inválido, tentando de novo...")
         time.sleep(delay)
 
@@ -312,9 +445,9 @@ def get_price_with_retries(url: str,
 # =============================================================================
 
 def run_scraper():
-    ensure_schema()
-
+    # uma conexão só para a rodada inteira (schema + leituras + gravações)
     conn = get_conn()
+    ensure_schema(conn)
     cur = conn.cursor()
 
     # lê todos os produtos cadastrados
@@ -336,9 +469,22 @@ def run_scraper():
     falhas = 0
     outliers = 0
 
+    # linhas aceitas na rodada; gravadas de uma vez só no final
+    rows_to_insert: list[tuple[int, float, str]] = []
+
+    # a rede domina o tempo: busca todas as páginas em paralelo e deixa
+    # o filtro de outlier + gravação no banco sequenciais na thread principal.
+    # URLs repetidas (mesmo anúncio cadastrado mais de uma vez) são buscadas
+    # uma vez só; o preço vale para todos os produtos com aquela URL
+    unique_urls = list(dict.fromkeys(p[2] for p in products))
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        price_by_url = dict(
+            zip(unique_urls, executor.map(get_price_with_retries, unique_urls))
+        )
+
     for pid, name, url in products:
+        price = price_by_url[url]
         print(f"\n[PRODUTO] ID {pid} - {name}")
-        price = get_price_with_retries(url)
 
         if price is None:
             falhas += 1
@@ -363,14 +509,22 @@ def run_scraper():
                     )
                 continue
 
-        # insere registro na tabela prices
-        cur.execute(
-            "INSERT INTO prices (product_id, price, date) VALUES (?, ?, ?)",
-            (pid, price, now_str),
-        )
-        conn.commit()
+        rows_to_insert.append((pid, price, now_str))
         sucessos += 1
-        print(f"[SAVE] Gravado no banco: product_id={pid}, price={price:.2f}, date={now_str}")
+        print(f"[OK] Preço aceito: product_id={pid}, price={price:.2f}")
+
+    # uma transação só (um commit/fsync) para a rodada inteira
+    if rows_to_insert:
+        with conn:
+            cur.executemany(
+                "INSERT INTO prices (product_id, price, date) VALUES (?, ?, ?)",
+                rows_to_insert,
+            )
+            cur.executemany(
+                "UPDATE products SET last_update = ? WHERE id = ?",
+                [(date, pid) for pid, _, date in rows_to_insert],
+            )
+        print(f"\n[SAVE] {len(rows_to_insert)} preço(s) gravado(s) no banco, date={now_str}")
 
     conn.close()
     print(
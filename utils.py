@@ -1,6 +1,10 @@
 import re
 from typing import Optional
 
+# padrões compilados uma vez só (extract_price roda várias vezes por página)
+_BRL_PRICE_RE = re.compile(r"R\$\s*([\d\.\,]+)")
+_NUMBER_RE = re.compile(r"\d+(?:[\.,]\d+)?")
+
 
 def extract_price(text: str | None) -> Optional[float]:
     """
@@ -12,21 +16,22 @@ def extract_price(text: str | None) -> Optional[float]:
     if not text:
         return None
 
-    # Normaliza espaços
-    text = re.sub(r"\s+", " ", text)
-
+    # Sem normalizar espaços antes: o \s* do padrão já aceita qualquer espaço
+    # entre "R$" e o número, e os grupos capturados não contêm espaço.
     candidates: list[float] = []
 
     # 1) Padrões explícitos com "R$"
     #    Ex: "R$ 3.379,00", "por R$3.199,90", etc.
-    for match in re.findall(r"R\$\s*([\d\.\,]+)", text):
-        cleaned = match.replace(".", "").replace(",", ".")
-        try:
-            value = float(cleaned)
-            if value > 1:  # ignora 0,00 / 0 / 0.5 etc.
-                candidates.append(value)
-        except ValueError:
-            continue
+    #    (texto de bloco de preço quase nunca tem "R$": pula a varredura)
+    if "R$" in text:
+        for match in _BRL_PRICE_RE.findall(text):
+            cleaned = match.replace(".", "").replace(",", ".")
+            try:
+                value = float(cleaned)
+                if value > 1:  # ignora 0,00 / 0 / 0.5 etc.
+                    candidates.append(value)
+            except ValueError:
+                continue
 
     if candidates:
         # Na Amazon, o preço do produto em si quase sempre é o maior valor
@@ -34,8 +39,9 @@ def extract_price(text: str | None) -> Optional[float]:
 
     # 2) Fallback: qualquer número com vírgula/ponto
     #    (caso o texto não traga "R$")
-    for match in re.findall(r"\d+(?:[\.,]\d+)?", text):
-        cleaned = match.replace(".", "").replace(",", ".")
+    # finditer: para no primeiro número válido sem varrer o texto inteiro
+    for m in _NUMBER_RE.finditer(text):
+        cleaned = m.group(0).replace(".", "").replace(",", ".")
         try:
             value = float(cleaned)
             if value > 1: